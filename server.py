@@ -6,13 +6,30 @@ This server exposes OCR tools powered by macOS Vision framework via a Swift help
 
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
 import json
 import os
+import stat
 import subprocess
+import tempfile
+from collections import OrderedDict, deque
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
 
 from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.utilities.logging import get_logger
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON on the helper pipe
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: binary replies from the helper
+    msgpack = None
 
 NAME = "vision-framework-ocr"
 VERSION = "0.1.0"
@@ -20,9 +37,30 @@ VERSION = "0.1.0"
 SCRIPT_DIR = Path(__file__).resolve().parent
 HELPER_SCRIPT = SCRIPT_DIR / "vision_ocr.swift"
 HELPER_BIN = SCRIPT_DIR / ".build" / "vision_ocr"
+HELPER_STAMP = SCRIPT_DIR / ".build" / "vision_ocr.version"
 
 DEFAULT_LANGUAGES = ["ja-JP", "en-US"]
+_DEFAULT_LANGUAGES_TUPLE = tuple(DEFAULT_LANGUAGES)
 ALLOWED_LEVELS = {"accurate", "fast"}
+ALLOWED_EXTENSIONS = frozenset(
+    {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".heic", ".heif", ".bmp", ".gif", ".webp"}
+)
+
+# Each helper runs its own Vision request; cap the pool so batches do not
+# oversubscribe the machine.
+POOL_SIZE = min(os.cpu_count() or 1, 4)
+# Images per helper request. Small chunks let other tool calls take a pool
+# slot between chunks of a large batch and keep each reply bounded.
+HELPER_BATCH_SIZE = 8
+# Upper bound for one reply line from a helper (asyncio streams default to 64 KiB).
+HELPER_REPLY_LIMIT = 64 * 1024 * 1024
+
+# Results are cached by file content and OCR options. Files larger than
+# DIGEST_MAX_BYTES are keyed by path, size, and mtime instead of being read.
+CACHE_SIZE = 256
+DIGEST_MAX_BYTES = 50 * 1024 * 1024
+
+logger = get_logger(__name__)
 
 mcp = FastMCP(
     name=NAME,
@@ -47,121 +85,464 @@ def _as_bool(value: str) -> bool:
     raise ValueError(f"Cannot parse boolean: {value}")
 
 
+def _wire_format() -> str:
+    """Reply format for new helpers: MessagePack when available, unless forced to JSON."""
+    if msgpack is None or os.environ.get("VISION_OCR_WIRE_FORMAT", "").strip().lower() == "json":
+        return "json"
+    return "msgpack"
+
+
+def _env_flag(name: str) -> bool:
+    value = os.environ.get(name, "")
+    try:
+        return bool(value) and _as_bool(value)
+    except ValueError as exc:
+        raise OCRError(f"Invalid {name}: {exc}") from exc
+
+
+# Both operate on bytes so helper output is parsed without an extra decode.
+if orjson is not None:
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+else:
+    _loads = json.loads
+
+    def _dumps(value: Any) -> bytes:
+        return json.dumps(value).encode()
+
+
 def _resolve_image_path(path: str) -> Path:
+    return _stat_image_path(path)[0]
+
+
+def _stat_image_path(path: str) -> tuple[Path, os.stat_result]:
+    """Resolve and validate an image path, returning it with its stat result."""
     candidate = Path(path).expanduser()
     if not candidate.is_absolute():
-        candidate = (Path.cwd() / candidate).resolve()
-    else:
-        candidate = candidate.resolve()
+        candidate = Path.cwd() / candidate
+    candidate = candidate.resolve()
 
-    if not candidate.exists():
-        raise OCRError(f"File not found: {candidate}")
-    if not candidate.is_file():
+    try:
+        file_stat = candidate.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        raise OCRError(f"File not found: {candidate}") from None
+    if not stat.S_ISREG(file_stat.st_mode):
         raise OCRError(f"Path is not a file: {candidate}")
 
-    allowed = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".heic", ".heif", ".bmp", ".gif", ".webp"}
-    if candidate.suffix.lower() not in allowed:
+    if candidate.suffix.lower() not in ALLOWED_EXTENSIONS:
         raise OCRError(
-            f"Unsupported extension: {candidate.suffix}. Supported: {', '.join(sorted(allowed))}"
+            f"Unsupported extension: {candidate.suffix}. "
+            f"Supported: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
+        )
+
+    return candidate, file_stat
+
+
+@functools.lru_cache(maxsize=1)
+def _swift_toolchain() -> str:
+    try:
+        completed = subprocess.run(
+            ["xcrun", "swiftc", "--version"], text=True, capture_output=True, check=False
         )
+    except OSError:
+        return "unknown"
+    return (completed.stdout + completed.stderr).strip()
+
 
-    return candidate
+def _helper_stamp() -> str:
+    """Describe the toolchain and helper source a compiled binary must match.
+
+    The source is hashed on every call, so edits made while the server runs
+    are seen by the next check or build.
+    """
+    source = hashlib.blake2b(HELPER_SCRIPT.read_bytes(), digest_size=16).hexdigest()
+    return f"{_swift_toolchain()}\nsource {source}\n"
+
+
+def _helper_is_current() -> bool:
+    if not HELPER_SCRIPT.exists():
+        return True
+    try:
+        return HELPER_STAMP.read_text() == _helper_stamp()
+    except OSError:
+        return False
 
 
-def _helper_command() -> list[str]:
-    if HELPER_BIN.exists() and os.access(HELPER_BIN, os.X_OK):
+def _compiled_helper_ready() -> bool:
+    return HELPER_BIN.exists() and os.access(HELPER_BIN, os.X_OK) and _helper_is_current()
+
+
+# Resolved once per process, so a failed auto-compile is not retried on every
+# call; _build_helper resets it when the binary changes.
+_HELPER_COMMAND: list[str] | None = None
+_HELPER_COMMAND_LOCK = asyncio.Lock()
+
+
+async def _helper_command() -> list[str]:
+    global _HELPER_COMMAND
+    if _HELPER_COMMAND is not None:
+        return _HELPER_COMMAND
+
+    async with _HELPER_COMMAND_LOCK:
+        if _HELPER_COMMAND is None:
+            _HELPER_COMMAND = await _find_helper_command()
+    return _HELPER_COMMAND
+
+
+async def _find_helper_command() -> list[str]:
+    """Prefer the compiled helper, building it on first use unless opted out."""
+    if await asyncio.to_thread(_compiled_helper_ready):
         return [str(HELPER_BIN)]
 
     if not HELPER_SCRIPT.exists():
         raise OCRError(f"Swift helper script not found: {HELPER_SCRIPT}")
 
+    if not _env_flag("VISION_OCR_NO_AUTOCOMPILE"):
+        try:
+            await _build_helper(force=False)
+        except (OCRError, OSError) as exc:
+            # OSError covers an unwritable .build directory.
+            logger.warning("Compiling the Swift helper failed; using xcrun swift: %s", exc)
+        else:
+            return [str(HELPER_BIN)]
+
     return ["xcrun", "swift", str(HELPER_SCRIPT)]
 
 
-def _run_helper(
-    image_path: Path,
-    languages: list[str],
+class _HelperWorker:
+    """One long-lived Swift helper process running in --server mode.
+
+    The helper exits on its own when stdin closes, including when this server exits.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process, wire_format: str, limited: bool) -> None:
+        self.process = process
+        self.wire_format = wire_format
+        self.limited = limited
+        self.generation = 0
+        self._stderr: deque[bytes] = deque(maxlen=20)
+        self._stderr_reader = asyncio.create_task(self._drain_stderr())
+
+    @classmethod
+    async def start(cls, command: list[str], wire_format: str, limited: bool) -> _HelperWorker:
+        env = None
+        if limited:
+            # Accelerate and OpenMP read these at load time, so they must be in the
+            # helper's environment from the start. Values already set in the
+            # server's environment take precedence.
+            env = {"OMP_THREAD_LIMIT": "1", "VECLIB_MAXIMUM_THREADS": "1", **os.environ}
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                "--server",
+                "--format",
+                wire_format,
+                env=env,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=HELPER_REPLY_LIMIT,
+            )
+        except OSError as exc:
+            raise OCRError(f"Cannot start Swift OCR helper: {exc}") from exc
+        return cls(process, wire_format, limited)
+
+    async def _drain_stderr(self) -> None:
+        assert self.process.stderr is not None
+        async for line in self.process.stderr:
+            self._stderr.append(line)
+
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def request(self, message: dict[str, Any]) -> dict[str, Any]:
+        assert self.process.stdin is not None and self.process.stdout is not None
+        try:
+            self.process.stdin.write(_dumps(message) + b"\n")
+            await self.process.stdin.drain()
+            if self.wire_format == "msgpack":
+                header = await self.process.stdout.readexactly(4)
+                reply = await self.process.stdout.readexactly(int.from_bytes(header, "big"))
+            else:
+                reply = await self.process.stdout.readline()
+        except (OSError, asyncio.IncompleteReadError):
+            reply = b""
+        except ValueError as exc:
+            raise OCRError(f"Helper reply exceeded {HELPER_REPLY_LIMIT} bytes") from exc
+
+        if not reply:
+            await self.process.wait()
+            await asyncio.wait([self._stderr_reader], timeout=1)
+            stderr = b"".join(self._stderr).decode("utf-8", errors="replace").strip()
+            raise OCRError(stderr or "Swift OCR helper exited without output.")
+
+        try:
+            if self.wire_format == "msgpack":
+                return msgpack.unpackb(reply, raw=False)
+            return _loads(reply)
+        except ValueError as exc:
+            raise OCRError(f"Helper returned an invalid {self.wire_format} reply: {exc}") from exc
+
+    def terminate(self) -> None:
+        if self.alive():
+            try:
+                self.process.terminate()
+            except ProcessLookupError:
+                pass
+
+
+class HelperPool:
+    """Bounded pool of helper processes, spawned lazily and reused across calls.
+
+    Reusing processes avoids paying process startup and Vision warm-up per image.
+    Requests submitted with ``limited=True`` run on helpers capped at one compute
+    thread, for callers that keep several helpers busy at once; other requests
+    get helpers with no thread limit. At most ``size`` helpers of either kind
+    are alive at a time.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[_HelperWorker] = []
+        self._busy = 0
+        self._generation = 0
+
+    async def submit(self, message: dict[str, Any], limited: bool = False) -> dict[str, Any]:
+        async with self._slots:
+            # Counts helpers being started as well as those running a request.
+            self._busy += 1
+            try:
+                worker = await self._checkout(limited)
+                try:
+                    response = await worker.request(message)
+                except BaseException:
+                    worker.terminate()
+                    raise
+                if worker.generation == self._generation:
+                    self._idle.append(worker)
+                else:
+                    worker.terminate()
+            finally:
+                self._busy -= 1
+
+        error = response.get("error")
+        if error is not None:
+            raise OCRError(str(error))
+        return response
+
+    async def _checkout(self, limited: bool) -> _HelperWorker:
+        for position in range(len(self._idle) - 1, -1, -1):
+            worker = self._idle[position]
+            if not worker.alive():
+                del self._idle[position]
+                worker.terminate()
+            elif worker.limited == limited:
+                del self._idle[position]
+                return worker
+
+        # Make room by retiring idle helpers of the other kind.
+        while self._idle and self._busy + len(self._idle) > self.size:
+            self._idle.pop(0).terminate()
+
+        command = await _helper_command()
+        generation = self._generation
+        worker = await _HelperWorker.start(command, _wire_format(), limited)
+        worker.generation = generation
+        return worker
+
+    def retire(self) -> None:
+        """Stop idle helpers now and busy ones when their current request ends."""
+        self._generation += 1
+        while self._idle:
+            self._idle.pop().terminate()
+
+
+_POOL = HelperPool(POOL_SIZE)
+
+_OCR_CACHE: OrderedDict[tuple[Any, ...], dict[str, Any]] = OrderedDict()
+
+
+def _file_digest(path: Path) -> tuple[Any, ...] | str:
+    try:
+        with path.open("rb") as handle:
+            file_stat = os.fstat(handle.fileno())
+            if file_stat.st_size > DIGEST_MAX_BYTES:
+                return (str(path), file_stat.st_size, file_stat.st_mtime_ns)
+
+            # file_digest reads through a reusable buffer, so a file that is
+            # truncated while hashing just hashes short instead of faulting.
+            return hashlib.file_digest(
+                handle, lambda: hashlib.blake2b(digest_size=16)
+            ).hexdigest()
+    except OSError as exc:
+        raise OCRError(f"Cannot read file: {path}: {exc}") from exc
+
+
+def _cache_get(key: tuple[Any, ...]) -> dict[str, Any] | None:
+    payload = _OCR_CACHE.get(key)
+    if payload is not None:
+        _OCR_CACHE.move_to_end(key)
+    return payload
+
+
+def _cache_put(key: tuple[Any, ...], payload: dict[str, Any]) -> None:
+    _OCR_CACHE[key] = payload
+    _OCR_CACHE.move_to_end(key)
+    while len(_OCR_CACHE) > CACHE_SIZE:
+        _OCR_CACHE.popitem(last=False)
+
+
+class _HelperOptions(NamedTuple):
+    """OCR options shared by every image in one helper request."""
+
+    languages: tuple[str, ...]
+    recognition_level: str
+    language_correction: bool
+    sort_reading_order: bool
+    min_confidence: float
+    text_only: bool = False
+
+
+def _helper_options(
+    languages: tuple[str, ...],
     recognition_level: str,
     language_correction: bool,
     sort_reading_order: bool,
     min_confidence: float,
-) -> dict[str, Any]:
+    text_only: bool = False,
+) -> _HelperOptions:
     if recognition_level not in ALLOWED_LEVELS:
         raise OCRError(f"recognition_level must be one of {sorted(ALLOWED_LEVELS)}")
     if not (0.0 <= min_confidence <= 1.0):
         raise OCRError("min_confidence must be between 0.0 and 1.0")
 
-    command = _helper_command() + [
-        "--input",
-        str(image_path),
-        "--languages",
-        ",".join(languages),
-        "--recognition-level",
-        recognition_level,
-        "--language-correction",
-        str(language_correction).lower(),
-        "--sort-reading-order",
-        str(sort_reading_order).lower(),
-        "--min-confidence",
-        f"{min_confidence:.3f}",
-    ]
+    return _HelperOptions(
+        languages=languages,
+        recognition_level=recognition_level,
+        language_correction=language_correction,
+        sort_reading_order=sort_reading_order,
+        min_confidence=round(min_confidence, 3),
+        text_only=text_only,
+    )
 
-    completed = subprocess.run(
-        command,
-        text=True,
-        capture_output=True,
-        check=False,
+
+async def _run_helper_async(
+    image_path: Path,
+    languages: tuple[str, ...],
+    recognition_level: str,
+    language_correction: bool,
+    sort_reading_order: bool,
+    min_confidence: float,
+    text_only: bool = False,
+) -> dict[str, Any]:
+    options = _helper_options(
+        languages=languages,
+        recognition_level=recognition_level,
+        language_correction=language_correction,
+        sort_reading_order=sort_reading_order,
+        min_confidence=min_confidence,
+        text_only=text_only,
+    )
+    outcome = (await _run_helper_batch([image_path], options))[0]
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+
+async def _run_helper_batch(
+    image_paths: list[Path],
+    options: _HelperOptions,
+) -> list[dict[str, Any] | Exception]:
+    """OCR images that share one set of options, in input order.
+
+    Cached images skip the helper. The rest are sent in requests of at most
+    HELPER_BATCH_SIZE images, spread across the pool. With
+    text_only, results carry only full_text and a cached full result is reused.
+    """
+    outcomes: list[Any] = [None] * len(image_paths)
+    misses: list[tuple[int, tuple[Any, ...]]] = []
+
+    # Shared by every image in the call, so build them once.
+    path_strings = [str(image_path) for image_path in image_paths]
+    full_options = options._replace(text_only=False)
+    request_options = options._asdict()
+
+    digests = await asyncio.gather(
+        *(asyncio.to_thread(_file_digest, image_path) for image_path in image_paths),
+        return_exceptions=True,
     )
 
-    if completed.returncode != 0:
-        stderr = (completed.stderr or "").strip()
-        if not stderr:
-            stderr = "Swift OCR helper failed without stderr output."
-        raise OCRError(stderr)
+    for index, digest in enumerate(digests):
+        if isinstance(digest, Exception):
+            outcomes[index] = digest
+            continue
+
+        key = (digest, options)
+        cached = _cache_get(key)
+        if cached is None and options.text_only:
+            full = _cache_get((digest, full_options))
+            if full is not None:
+                cached = {"full_text": full.get("full_text", "")}
+
+        if cached is None:
+            misses.append((index, key))
+        elif options.text_only:
+            outcomes[index] = cached
+        else:
+            # Identical content may live at another path; report the requested one.
+            path = path_strings[index]
+            outcomes[index] = dict(cached, path=path, resolved_path=path)
+
+    chunks = [
+        misses[start : start + HELPER_BATCH_SIZE]
+        for start in range(0, len(misses), HELPER_BATCH_SIZE)
+    ]
+    runners = min(_POOL.size, len(chunks))
 
-    try:
-        payload = json.loads(completed.stdout)
-    except json.JSONDecodeError as exc:
-        raise OCRError(f"Helper returned invalid JSON: {exc}") from exc
+    async def dispatch(chunk: list[tuple[int, tuple[Any, ...]]]) -> None:
+        request = dict(request_options, jobs=[{"path": path_strings[index]} for index, _ in chunk])
 
-    return _normalize_payload(payload)
+        try:
+            # Cap compute threads only when this batch keeps several helpers busy.
+            replies = (await _POOL.submit(request, limited=runners > 1)).get("results")
+            if (
+                not isinstance(replies, list)
+                or len(replies) != len(chunk)
+                or not all(isinstance(reply, dict) for reply in replies)
+            ):
+                raise OCRError("Helper returned a malformed batch reply.")
+        except Exception as exc:  # noqa: BLE001
+            # Every job in the chunk fails alone; ocr_batch reports them per path.
+            replies = [{"error": str(exc)}] * len(chunk)
 
+        for (index, key), reply in zip(chunk, replies):
+            error = reply.get("error")
+            if error is not None:
+                outcomes[index] = OCRError(str(error))
+                continue
+            reply.pop("schema", None)
+            _cache_put(key, reply)
+            outcomes[index] = reply
 
-def _normalize_payload(payload: dict[str, Any]) -> dict[str, Any]:
-    normalized = dict(payload)
+    # At most one chunk per pool slot waits on the semaphore at a time, so a
+    # concurrent call queues behind one chunk rather than the whole batch.
+    pending = iter(chunks)
 
-    if "resolvedPath" in normalized and "resolved_path" not in normalized:
-        normalized["resolved_path"] = normalized.pop("resolvedPath")
-    if "lineCount" in normalized and "line_count" not in normalized:
-        normalized["line_count"] = normalized.pop("lineCount")
-    if "fullText" in normalized and "full_text" not in normalized:
-        normalized["full_text"] = normalized.pop("fullText")
+    async def drain() -> None:
+        for chunk in pending:
+            await dispatch(chunk)
 
-    lines = normalized.get("lines")
-    if isinstance(lines, list):
-        converted_lines: list[dict[str, Any]] = []
-        for line in lines:
-            if not isinstance(line, dict):
-                continue
-            converted_line = dict(line)
-            bbox = converted_line.get("bbox")
-            if isinstance(bbox, dict):
-                converted_bbox = dict(bbox)
-                if "minX" in converted_bbox and "min_x" not in converted_bbox:
-                    converted_bbox["min_x"] = converted_bbox.pop("minX")
-                if "minY" in converted_bbox and "min_y" not in converted_bbox:
-                    converted_bbox["min_y"] = converted_bbox.pop("minY")
-                converted_line["bbox"] = converted_bbox
-            converted_lines.append(converted_line)
-        normalized["lines"] = converted_lines
+    await asyncio.gather(*(drain() for _ in range(runners)))
 
-    return normalized
+    return outcomes
 
 
-def _default_languages(languages: list[str] | None) -> list[str]:
-    if languages is None or len(languages) == 0:
-        return DEFAULT_LANGUAGES
-    return languages
+def _default_languages(languages: list[str] | None) -> tuple[str, ...]:
+    if not languages:
+        return _DEFAULT_LANGUAGES_TUPLE
+    return tuple(languages)
 
 
 @mcp.tool(
@@ -170,7 +551,7 @@ def _default_languages(languages: list[str] | None) -> list[str]:
         "(lines, confidence, bounding boxes, full text)."
     )
 )
-def ocr_image(
+async def ocr_image(
     path: str,
     languages: list[str] | None = None,
     recognition_level: str = "accurate",
@@ -180,7 +561,7 @@ def ocr_image(
 ) -> dict[str, Any]:
     """OCR one image file and return structured result."""
     image_path = _resolve_image_path(path)
-    return _run_helper(
+    return await _run_helper_async(
         image_path=image_path,
         languages=_default_languages(languages),
         recognition_level=recognition_level,
@@ -196,7 +577,7 @@ def ocr_image(
         "for files that failed."
     )
 )
-def ocr_batch(
+async def ocr_batch(
     paths: list[str],
     languages: list[str] | None = None,
     recognition_level: str = "accurate",
@@ -204,26 +585,71 @@ def ocr_batch(
     sort_reading_order: bool = True,
     min_confidence: float = 0.0,
 ) -> dict[str, Any]:
-    """OCR many image files and return aggregated output."""
+    """OCR many image files and return aggregated output.
+
+    Inputs that refer to the same file (repeated paths, symlinks, hard links)
+    are OCR'd once and share one result. A file modified while the batch runs
+    is not detected.
+    """
     effective_languages = _default_languages(languages)
 
+    outcomes: list[Any] = [None] * len(paths)
+
+    try:
+        options = _helper_options(
+            languages=effective_languages,
+            recognition_level=recognition_level,
+            language_correction=language_correction,
+            sort_reading_order=sort_reading_order,
+            min_confidence=min_confidence,
+        )
+    except OCRError as exc:
+        outcomes = [exc] * len(paths)
+    else:
+        # Memoized for this call only: one stat per distinct path string.
+        stats: dict[str, tuple[Path, os.stat_result] | Exception] = {}
+        unique: dict[tuple[int, int, int, int], list[tuple[int, Path]]] = {}
+        unique_paths: list[Path] = []
+        for index, path in enumerate(paths):
+            if path not in stats:
+                try:
+                    stats[path] = _stat_image_path(path)
+                except OSError as exc:
+                    stats[path] = OCRError(f"Cannot read file: {path}: {exc}")
+                except Exception as exc:  # noqa: BLE001
+                    stats[path] = exc
+
+            entry = stats[path]
+            if isinstance(entry, Exception):
+                outcomes[index] = entry
+                continue
+            image_path, file_stat = entry
+
+            key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+            if key not in unique:
+                unique[key] = []
+                unique_paths.append(image_path)
+            unique[key].append((index, image_path))
+
+        batch = await _run_helper_batch(unique_paths, options)
+        for image_path, duplicates, outcome in zip(unique_paths, unique.values(), batch):
+            for index, duplicate_path in duplicates:
+                if duplicate_path != image_path and isinstance(outcome, dict) and "path" in outcome:
+                    # Hard link: same file under another name.
+                    outcomes[index] = dict(
+                        outcome, path=str(duplicate_path), resolved_path=str(duplicate_path)
+                    )
+                else:
+                    outcomes[index] = outcome
+
     results: list[dict[str, Any]] = []
     errors: list[dict[str, str]] = []
 
-    for path in paths:
-        try:
-            image_path = _resolve_image_path(path)
-            result = _run_helper(
-                image_path=image_path,
-                languages=effective_languages,
-                recognition_level=recognition_level,
-                language_correction=language_correction,
-                sort_reading_order=sort_reading_order,
-                min_confidence=min_confidence,
-            )
-            results.append(result)
-        except Exception as exc:  # noqa: BLE001
-            errors.append({"path": path, "error": str(exc)})
+    for path, outcome in zip(paths, outcomes):
+        if isinstance(outcome, Exception):
+            errors.append({"path": path, "error": str(outcome)})
+        else:
+            results.append(outcome)
 
     return {
         "total": len(paths),
@@ -240,7 +666,7 @@ def ocr_batch(
         "Useful when structured metadata is unnecessary."
     )
 )
-def ocr_text(
+async def ocr_text(
     path: str,
     languages: list[str] | None = None,
     recognition_level: str = "accurate",
@@ -249,51 +675,120 @@ def ocr_text(
     min_confidence: float = 0.0,
 ) -> str:
     """OCR one image and return full_text only."""
-    result = ocr_image(
-        path=path,
-        languages=languages,
+    result = await _run_helper_async(
+        image_path=_resolve_image_path(path),
+        languages=_default_languages(languages),
         recognition_level=recognition_level,
         language_correction=language_correction,
         sort_reading_order=sort_reading_order,
         min_confidence=min_confidence,
+        text_only=True,
     )
-    full_text = result.get("full_text")
-    if full_text is None:
-        full_text = result.get("fullText", "")
-    return str(full_text)
+    return str(result.get("full_text", ""))
+
+
+async def _run_build_step(command: list[str], env: dict[str, str] | None = None) -> None:
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+        )
+    except OSError as exc:
+        raise OCRError(f"Cannot run {command[0]}: {exc}") from exc
+
+    _, err = await process.communicate()
+    if process.returncode != 0:
+        stderr = err.decode("utf-8", errors="replace").strip()
+        raise OCRError(stderr or f"{' '.join(command[:2])} failed")
+
+
+_BUILD_LOCK = asyncio.Lock()
+
+
+async def _build_helper(sample_image: Path | None = None, force: bool = True) -> None:
+    """Build HELPER_BIN, profile-guided when a training image is given.
+
+    The binary and stamp are built beside their targets and renamed into place,
+    so a failed build leaves the previous helper usable. With ``force=False``
+    the build is skipped if another caller finished one while this one waited.
+    """
+    global _HELPER_COMMAND
+
+    if not HELPER_SCRIPT.exists():
+        raise OCRError(f"Swift helper script not found: {HELPER_SCRIPT}")
+
+    async with _BUILD_LOCK:
+        if not force and await asyncio.to_thread(_compiled_helper_ready):
+            return
+
+        HELPER_BIN.parent.mkdir(parents=True, exist_ok=True)
+        # Taken before compiling: if the script changes mid-build, the stamp
+        # keeps the old hash and the new binary reads as stale.
+        stamp_text = await asyncio.to_thread(_helper_stamp)
+
+        swiftc = [
+            "xcrun",
+            "swiftc",
+            "-O",
+            "-whole-module-optimization",
+            "-cross-module-optimization",
+            str(HELPER_SCRIPT),
+        ]
+
+        # Same directory as HELPER_BIN so the final renames stay on one filesystem.
+        with tempfile.TemporaryDirectory(dir=HELPER_BIN.parent, prefix=".build-") as tmp:
+            work_dir = Path(tmp)
+            output = work_dir / "vision_ocr.out"
+
+            if sample_image is None:
+                await _run_build_step(swiftc + ["-o", str(output)])
+            else:
+                instrumented = work_dir / "vision_ocr"
+                profdata = work_dir / "vision_ocr.profdata"
+                env = dict(os.environ, LLVM_PROFILE_FILE=str(work_dir / "%p.profraw"))
+
+                await _run_build_step(swiftc + ["-profile-generate", "-o", str(instrumented)])
+                await _run_build_step([str(instrumented), "--input", str(sample_image)], env=env)
+                await _run_build_step(
+                    [str(instrumented), "--input", str(sample_image), "--text-only"], env=env
+                )
+                await _run_build_step(
+                    ["xcrun", "llvm-profdata", "merge", "-output", str(profdata)]
+                    + [str(path) for path in work_dir.glob("*.profraw")]
+                )
+                await _run_build_step(swiftc + [f"-profile-use={profdata}", "-o", str(output)])
+
+            stamp = work_dir / "vision_ocr.version"
+            stamp.write_text(stamp_text)
+            # Binary first: until the stamp follows, the new binary reads as stale.
+            os.replace(output, HELPER_BIN)
+            os.replace(stamp, HELPER_STAMP)
+
+        _HELPER_COMMAND = [str(HELPER_BIN)]
+        # Running helpers were started from the previous binary or command.
+        _POOL.retire()
 
 
 @mcp.tool(
     description=(
         "Compile the Swift helper to a native binary for faster OCR calls. "
-        "By default the server runs the Swift script directly."
+        "The server also compiles it automatically on first use. "
+        "Set pgo with a representative sample_image for a profile-guided build."
     )
 )
-def compile_helper() -> dict[str, str]:
+async def compile_helper(pgo: bool = False, sample_image: str | None = None) -> dict[str, str]:
     """Compile vision_ocr.swift to .build/vision_ocr."""
-    if not HELPER_SCRIPT.exists():
-        raise OCRError(f"Swift helper script not found: {HELPER_SCRIPT}")
-
-    out_dir = HELPER_BIN.parent
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    command = [
-        "xcrun",
-        "swiftc",
-        "-O",
-        str(HELPER_SCRIPT),
-        "-o",
-        str(HELPER_BIN),
-    ]
+    if pgo and not sample_image:
+        raise OCRError("pgo requires sample_image to collect a profile")
 
-    completed = subprocess.run(command, text=True, capture_output=True, check=False)
-    if completed.returncode != 0:
-        stderr = (completed.stderr or "").strip()
-        raise OCRError(stderr or "swiftc failed")
+    await _build_helper(_resolve_image_path(sample_image) if pgo and sample_image else None)
 
     return {
         "binary": str(HELPER_BIN),
         "status": "compiled",
+        "pgo": str(pgo).lower(),
     }
 
 
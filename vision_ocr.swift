@@ -3,6 +3,11 @@ import Vision
 import CoreGraphics
 import ImageIO
 
+enum OutputFormat: String {
+    case json
+    case msgpack
+}
+
 struct Options {
     var inputPath: String = ""
     var languages: [String] = ["ja-JP", "en-US"]
@@ -10,6 +15,269 @@ struct Options {
     var languageCorrection: Bool = true
     var sortReadingOrder: Bool = true
     var minConfidence: Double = 0.0
+    var textOnly: Bool = false
+    var serverMode: Bool = false
+    var batchMode: Bool = false
+    var format: OutputFormat = .json
+}
+
+struct JobOptions: Decodable {
+    let languages: [String]?
+    let recognitionLevel: String?
+    let languageCorrection: Bool?
+    let sortReadingOrder: Bool?
+    let minConfidence: Double?
+    let textOnly: Bool?
+
+    enum CodingKeys: String, CodingKey {
+        case languages
+        case recognitionLevel = "recognition_level"
+        case languageCorrection = "language_correction"
+        case sortReadingOrder = "sort_reading_order"
+        case minConfidence = "min_confidence"
+        case textOnly = "text_only"
+    }
+}
+
+struct Job: Decodable {
+    let path: String
+    let options: JobOptions
+
+    enum CodingKeys: String, CodingKey {
+        case path
+    }
+
+    init(from decoder: Decoder) throws {
+        let container = try decoder.container(keyedBy: CodingKeys.self)
+        path = try container.decode(String.self, forKey: .path)
+        options = try JobOptions(from: decoder)
+    }
+}
+
+// Options at the top level apply to every job; a job may override them.
+struct BatchRequest: Decodable {
+    let jobs: [Job]
+    let options: JobOptions
+
+    enum CodingKeys: String, CodingKey {
+        case jobs
+    }
+
+    init(from decoder: Decoder) throws {
+        let container = try decoder.container(keyedBy: CodingKeys.self)
+        jobs = try container.decode([Job].self, forKey: .jobs)
+        options = try JobOptions(from: decoder)
+    }
+}
+
+struct ServerError: Encodable {
+    let error: String
+}
+
+enum JobReply: Encodable {
+    case success(OCRResult)
+    case text(OCRText)
+    case failure(ServerError)
+
+    func encode(to encoder: Encoder) throws {
+        switch self {
+        case .success(let result):
+            try result.encode(to: encoder)
+        case .text(let result):
+            try result.encode(to: encoder)
+        case .failure(let error):
+            try error.encode(to: encoder)
+        }
+    }
+}
+
+struct BatchReply: Encodable {
+    let results: [JobReply]
+}
+
+// Minimal MessagePack writer covering the value types the helper emits.
+struct MessagePackWriter {
+    private(set) var data = Data()
+
+    mutating func packMapHeader(_ count: Int) {
+        if count < 16 {
+            data.append(0x80 | UInt8(count))
+        } else if count <= 0xFFFF {
+            data.append(0xDE)
+            appendBigEndian(UInt16(count))
+        } else {
+            data.append(0xDF)
+            appendBigEndian(UInt32(count))
+        }
+    }
+
+    mutating func packArrayHeader(_ count: Int) {
+        if count < 16 {
+            data.append(0x90 | UInt8(count))
+        } else if count <= 0xFFFF {
+            data.append(0xDC)
+            appendBigEndian(UInt16(count))
+        } else {
+            data.append(0xDD)
+            appendBigEndian(UInt32(count))
+        }
+    }
+
+    mutating func pack(_ value: String) {
+        let bytes = Array(value.utf8)
+        let count = bytes.count
+        if count < 32 {
+            data.append(0xA0 | UInt8(count))
+        } else if count <= 0xFF {
+            data.append(0xD9)
+            data.append(UInt8(count))
+        } else if count <= 0xFFFF {
+            data.append(0xDA)
+            appendBigEndian(UInt16(count))
+        } else {
+            data.append(0xDB)
+            appendBigEndian(UInt32(count))
+        }
+        data.append(contentsOf: bytes)
+    }
+
+    mutating func pack(_ value: Int) {
+        if value >= 0 && value < 128 {
+            data.append(UInt8(value))
+        } else {
+            data.append(0xD3)
+            appendBigEndian(UInt64(bitPattern: Int64(value)))
+        }
+    }
+
+    mutating func pack(_ value: Double) {
+        data.append(0xCB)
+        appendBigEndian(value.bitPattern)
+    }
+
+    private mutating func appendBigEndian<T: FixedWidthInteger>(_ value: T) {
+        withUnsafeBytes(of: value.bigEndian) { data.append(contentsOf: $0) }
+    }
+}
+
+// MessagePack output uses the same snake_case keys as the JSON encoding.
+protocol MessagePackable {
+    func pack(into writer: inout MessagePackWriter)
+}
+
+extension BBox: MessagePackable {
+    func pack(into writer: inout MessagePackWriter) {
+        writer.packMapHeader(4)
+        writer.pack("min_x")
+        writer.pack(minX)
+        writer.pack("min_y")
+        writer.pack(minY)
+        writer.pack("width")
+        writer.pack(width)
+        writer.pack("height")
+        writer.pack(height)
+    }
+}
+
+extension OCRLine: MessagePackable {
+    func pack(into writer: inout MessagePackWriter) {
+        writer.packMapHeader(3)
+        writer.pack("text")
+        writer.pack(text)
+        writer.pack("confidence")
+        writer.pack(confidence)
+        writer.pack("bbox")
+        bbox.pack(into: &writer)
+    }
+}
+
+extension OCRResult: MessagePackable {
+    func pack(into writer: inout MessagePackWriter) {
+        writer.packMapHeader(8)
+        writer.pack("schema")
+        writer.pack(schema)
+        writer.pack("path")
+        writer.pack(path)
+        writer.pack("resolved_path")
+        writer.pack(resolvedPath)
+        writer.pack("width")
+        writer.pack(width)
+        writer.pack("height")
+        writer.pack(height)
+        writer.pack("line_count")
+        writer.pack(lineCount)
+        writer.pack("full_text")
+        writer.pack(fullText)
+        writer.pack("lines")
+        writer.packArrayHeader(lines.count)
+        for line in lines {
+            line.pack(into: &writer)
+        }
+    }
+}
+
+extension OCRText: MessagePackable {
+    func pack(into writer: inout MessagePackWriter) {
+        writer.packMapHeader(2)
+        writer.pack("schema")
+        writer.pack(schema)
+        writer.pack("full_text")
+        writer.pack(fullText)
+    }
+}
+
+extension ServerError: MessagePackable {
+    func pack(into writer: inout MessagePackWriter) {
+        writer.packMapHeader(1)
+        writer.pack("error")
+        writer.pack(error)
+    }
+}
+
+extension JobReply: MessagePackable {
+    func pack(into writer: inout MessagePackWriter) {
+        switch self {
+        case .success(let result):
+            result.pack(into: &writer)
+        case .text(let result):
+            result.pack(into: &writer)
+        case .failure(let error):
+            error.pack(into: &writer)
+        }
+    }
+}
+
+extension BatchReply: MessagePackable {
+    func pack(into writer: inout MessagePackWriter) {
+        writer.packMapHeader(1)
+        writer.pack("results")
+        writer.packArrayHeader(results.count)
+        for result in results {
+            result.pack(into: &writer)
+        }
+    }
+}
+
+struct ReplyEncoder {
+    let format: OutputFormat
+    let json: JSONEncoder
+
+    init(format: OutputFormat) {
+        self.format = format
+        json = JSONEncoder()
+        json.outputFormatting = [.withoutEscapingSlashes]
+    }
+
+    func encode<T: Encodable & MessagePackable>(_ value: T) throws -> Data {
+        switch format {
+        case .json:
+            return try json.encode(value)
+        case .msgpack:
+            var writer = MessagePackWriter()
+            value.pack(into: &writer)
+            return writer.data
+        }
+    }
 }
 
 struct BBox: Codable {
@@ -17,6 +285,13 @@ struct BBox: Codable {
     let minY: Double
     let width: Double
     let height: Double
+
+    enum CodingKeys: String, CodingKey {
+        case minX = "min_x"
+        case minY = "min_y"
+        case width
+        case height
+    }
 }
 
 struct OCRLine: Codable {
@@ -25,7 +300,9 @@ struct OCRLine: Codable {
     let bbox: BBox
 }
 
+// Output keys are snake_case; "schema" lets the server skip key renaming.
 struct OCRResult: Codable {
+    var schema: Int = 2
     let path: String
     let resolvedPath: String
     let width: Int
@@ -33,6 +310,28 @@ struct OCRResult: Codable {
     let lineCount: Int
     let fullText: String
     let lines: [OCRLine]
+
+    enum CodingKeys: String, CodingKey {
+        case schema
+        case path
+        case resolvedPath = "resolved_path"
+        case width
+        case height
+        case lineCount = "line_count"
+        case fullText = "full_text"
+        case lines
+    }
+}
+
+// Text-only output skips per-line records entirely.
+struct OCRText: Encodable {
+    var schema: Int = 2
+    let fullText: String
+
+    enum CodingKeys: String, CodingKey {
+        case schema
+        case fullText = "full_text"
+    }
 }
 
 enum ArgError: Error, CustomStringConvertible {
@@ -116,12 +415,28 @@ func parseArgs() throws -> Options {
             }
             options.minConfidence = value
             i += 2
+        case "--text-only":
+            options.textOnly = true
+            i += 1
+        case "--server":
+            options.serverMode = true
+            i += 1
+        case "--batch":
+            options.batchMode = true
+            i += 1
+        case "--format":
+            guard i + 1 < args.count else { throw ArgError.missingValue(arg) }
+            guard let format = OutputFormat(rawValue: args[i + 1].lowercased()) else {
+                throw ArgError.invalidValue("format must be json or msgpack")
+            }
+            options.format = format
+            i += 2
         default:
             throw ArgError.unknownArgument(arg)
         }
     }
 
-    if options.inputPath.isEmpty {
+    if options.inputPath.isEmpty && !options.serverMode && !options.batchMode {
         throw ArgError.missingInput
     }
 
@@ -141,13 +456,34 @@ func loadImage(_ path: String) throws -> (CGImage, URL) {
     return (image, url)
 }
 
-func ocr(options: Options) throws -> OCRResult {
-    let (image, resolvedURL) = try loadImage(options.inputPath)
+func makeTextRequest(_ options: Options, reusing previous: VNRecognizeTextRequest? = nil) -> VNRecognizeTextRequest {
+    let level: VNRequestTextRecognitionLevel = options.recognitionLevel == "fast" ? .fast : .accurate
+
+    if let previous = previous,
+       previous.recognitionLanguages == options.languages,
+       previous.usesLanguageCorrection == options.languageCorrection,
+       previous.recognitionLevel == level {
+        return previous
+    }
 
     let request = VNRecognizeTextRequest()
     request.recognitionLanguages = options.languages
     request.usesLanguageCorrection = options.languageCorrection
-    request.recognitionLevel = options.recognitionLevel == "fast" ? .fast : .accurate
+    request.recognitionLevel = level
+    return request
+}
+
+// Top-to-bottom by line midpoint, then left-to-right within a line.
+func readsBefore(_ lhs: (minX: Double, midY: Double), _ rhs: (minX: Double, midY: Double)) -> Bool {
+    if abs(lhs.midY - rhs.midY) > 0.015 {
+        return lhs.midY > rhs.midY
+    }
+
+    return lhs.minX < rhs.minX
+}
+
+func ocr(options: Options, request: VNRecognizeTextRequest) throws -> OCRResult {
+    let (image, resolvedURL) = try loadImage(options.inputPath)
 
     let handler = VNImageRequestHandler(cgImage: image, options: [:])
     try handler.perform([request])
@@ -178,14 +514,10 @@ func ocr(options: Options) throws -> OCRResult {
 
     if options.sortReadingOrder {
         lines.sort { lhs, rhs in
-            let lhsMidY = lhs.bbox.minY + (lhs.bbox.height / 2.0)
-            let rhsMidY = rhs.bbox.minY + (rhs.bbox.height / 2.0)
-
-            if abs(lhsMidY - rhsMidY) > 0.015 {
-                return lhsMidY > rhsMidY
-            }
-
-            return lhs.bbox.minX < rhs.bbox.minX
+            readsBefore(
+                (lhs.bbox.minX, lhs.bbox.minY + (lhs.bbox.height / 2.0)),
+                (rhs.bbox.minX, rhs.bbox.minY + (rhs.bbox.height / 2.0))
+            )
         }
     }
 
@@ -202,10 +534,145 @@ func ocr(options: Options) throws -> OCRResult {
     )
 }
 
+func ocrText(options: Options, request: VNRecognizeTextRequest) throws -> OCRText {
+    let (image, _) = try loadImage(options.inputPath)
+
+    let handler = VNImageRequestHandler(cgImage: image, options: [:])
+    try handler.perform([request])
+
+    var lines: [(text: String, minX: Double, midY: Double)] = []
+
+    for observation in request.results ?? [] {
+        guard let candidate = observation.topCandidates(1).first else { continue }
+        if Double(candidate.confidence) < options.minConfidence {
+            continue
+        }
+
+        let box = observation.boundingBox
+        lines.append((candidate.string, Double(box.minX), Double(box.midY)))
+    }
+
+    if options.sortReadingOrder {
+        lines.sort { lhs, rhs in
+            readsBefore((lhs.minX, lhs.midY), (rhs.minX, rhs.midY))
+        }
+    }
+
+    return OCRText(fullText: lines.map { $0.text }.joined(separator: "\n"))
+}
+
+func applying(_ overrides: JobOptions, to defaults: Options) throws -> Options {
+    var options = defaults
+
+    if let languages = overrides.languages, !languages.isEmpty {
+        options.languages = languages
+    }
+    if let level = overrides.recognitionLevel {
+        let raw = level.lowercased()
+        if raw != "accurate" && raw != "fast" {
+            throw ArgError.invalidValue("recognition level must be accurate or fast")
+        }
+        options.recognitionLevel = raw
+    }
+    if let languageCorrection = overrides.languageCorrection {
+        options.languageCorrection = languageCorrection
+    }
+    if let sortReadingOrder = overrides.sortReadingOrder {
+        options.sortReadingOrder = sortReadingOrder
+    }
+    if let minConfidence = overrides.minConfidence {
+        if minConfidence < 0.0 || minConfidence > 1.0 {
+            throw ArgError.invalidValue("min-confidence must be between 0.0 and 1.0")
+        }
+        options.minConfidence = minConfidence
+    }
+    if let textOnly = overrides.textOnly {
+        options.textOnly = textOnly
+    }
+
+    return options
+}
+
+func describe(_ error: Error) -> String {
+    if let argError = error as? ArgError {
+        return argError.description
+    }
+    return error.localizedDescription
+}
+
+// Run every job in order, reusing one text request while options match.
+// A failing job is reported in its slot and does not abort the batch.
+func runBatch(_ batch: BatchRequest, defaults: Options) throws -> BatchReply {
+    let shared = try applying(batch.options, to: defaults)
+    var request: VNRecognizeTextRequest?
+    var results: [JobReply] = []
+    results.reserveCapacity(batch.jobs.count)
+
+    for job in batch.jobs {
+        let reply: JobReply = autoreleasepool {
+            do {
+                var options = try applying(job.options, to: shared)
+                options.inputPath = job.path
+                let textRequest = makeTextRequest(options, reusing: request)
+                request = textRequest
+                if options.textOnly {
+                    return .text(try ocrText(options: options, request: textRequest))
+                }
+                return .success(try ocr(options: options, request: textRequest))
+            } catch {
+                return .failure(ServerError(error: describe(error)))
+            }
+        }
+        results.append(reply)
+    }
+
+    return BatchReply(results: results)
+}
+
+func handleBatch(_ data: Data, defaults: Options, encoder: ReplyEncoder) -> Data {
+    do {
+        let batch = try JSONDecoder().decode(BatchRequest.self, from: data)
+        return try encoder.encode(try runBatch(batch, defaults: defaults))
+    } catch {
+        return (try? encoder.encode(ServerError(error: describe(error)))) ?? Data()
+    }
+}
+
+// JSON replies are newline-terminated; MessagePack replies carry a
+// big-endian UInt32 length prefix instead.
+func writeReply(_ data: Data, format: OutputFormat) {
+    var frame = Data()
+    switch format {
+    case .json:
+        frame = data
+        frame.append(0x0A)
+    case .msgpack:
+        withUnsafeBytes(of: UInt32(data.count).bigEndian) { frame.append(contentsOf: $0) }
+        frame.append(data)
+    }
+    FileHandle.standardOutput.write(frame)
+}
+
+// Serve one batch request per stdin line and write one reply frame each.
+// Failures are reported as {"error": ...} so the process stays up.
+func serve(defaults: Options) {
+    let encoder = ReplyEncoder(format: defaults.format)
+
+    while let raw = readLine(strippingNewline: true) {
+        if raw.isEmpty {
+            continue
+        }
+        let reply = handleBatch(Data(raw.utf8), defaults: defaults, encoder: encoder)
+        writeReply(reply, format: defaults.format)
+    }
+}
+
 func printUsage() {
     let usage = """
     usage:
       vision_ocr.swift --input <path> [options]
+      vision_ocr.swift --batch [options] < jobs.json
+      vision_ocr.swift --server [options]
 
     options:
       --languages ja-JP,en-US
@@ -213,6 +680,14 @@ func printUsage() {
       --language-correction true|false
       --sort-reading-order true|false
       --min-confidence 0.0..1.0
+      --text-only
+      --format json|msgpack
+
+    batch mode reads one JSON request from stdin and writes one JSON reply:
+      {"jobs": [{"path": "..."}, ...], "languages": [...], "recognition_level": "accurate", ...}
+      -> {"results": [<result or {"error": "..."}>, ...]}
+    server mode reads the same request once per stdin line and writes one
+    reply per stdout line (length-prefixed frames with --format msgpack).
     """
     fputs(usage + "\n", stderr)
 }
@@ -220,11 +695,26 @@ func printUsage() {
 func main() {
     do {
         let options = try parseArgs()
-        let result = try ocr(options: options)
+        if options.serverMode {
+            serve(defaults: options)
+            return
+        }
+
+        let encoder = ReplyEncoder(format: options.format)
 
-        let encoder = JSONEncoder()
-        encoder.outputFormatting = [.withoutEscapingSlashes]
-        let data = try encoder.encode(result)
+        if options.batchMode {
+            let input = FileHandle.standardInput.readDataToEndOfFile()
+            FileHandle.standardOutput.write(handleBatch(input, defaults: options, encoder: encoder))
+            return
+        }
+
+        let request = makeTextRequest(options)
+        let data: Data
+        if options.textOnly {
+            data = try encoder.encode(try ocrText(options: options, request: request))
+        } else {
+            data = try encoder.encode(try ocr(options: options, request: request))
+        }
         FileHandle.standardOutput.write(data)
     } catch let argError as ArgError {
         fputs("\(argError.description)\n", stderr)